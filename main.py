@@ -1,6 +1,7 @@
 # main.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
@@ -20,9 +21,13 @@ st.set_page_config(
 # ==================================================
 # 한글 폰트 깨짐 방지 (Streamlit)
 # ==================================================
+# @import 는 렌더링을 막으므로 preconnect + link 로 병렬 로드
+# (Streamlit 은 재실행 때 그려지지 않은 요소를 지우므로 매 실행마다 주입해야 함)
 st.markdown("""
+<link rel="preconnect" href="https://fonts.googleapis.com">
+<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
+<link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=Noto+Sans+KR&display=swap">
 <style>
-@import url('https://fonts.googleapis.com/css2?family=Noto+Sans+KR&display=swap');
 html, body, [class*="css"] {
     font-family: 'Noto Sans KR', 'Malgun Gothic', sans-serif;
 }
@@ -42,77 +47,195 @@ DATA_DIR = BASE_DIR / "data"
 # ==================================================
 # NFC / NFD 안전 파일 탐색
 # ==================================================
+# NFC 와 NFD 는 정규 등가이므로 NFC 기준 하나로 비교
+# (캐시된 load_growth_data 안에서만 호출되므로 별도 캐시는 두지 않음)
 def find_file_by_name(directory: Path, target_name: str):
     target_nfc = unicodedata.normalize("NFC", target_name)
-    target_nfd = unicodedata.normalize("NFD", target_name)
 
     for p in directory.iterdir():
-        if not p.is_file():
-            continue
-
-        name_nfc = unicodedata.normalize("NFC", p.name)
-        name_nfd = unicodedata.normalize("NFD", p.name)
-
-        if name_nfc == target_nfc or name_nfd == target_nfd:
+        if p.is_file() and unicodedata.normalize("NFC", p.name) == target_nfc:
             return p
     return None
 
+# ==================================================
+# EC 정보
+# ==================================================
+EC_INFO = {
+    "송도고": 1.0,
+    "하늘고": 2.0,  # 최적
+    "아라고": 4.0,
+    "동산고": 8.0,
+}
+
+SCHOOL_DTYPE = pd.CategoricalDtype(categories=list(EC_INFO.keys()))
+
+ENV_DTYPES = {
+    "time": "string",
+    "temperature": "float32",
+    "humidity": "float32",
+    "ph": "float32",
+    "ec": "float32",
+}
+
+GROWTH_COLUMNS = ("잎 수(장)", "지상부 길이(mm)", "지하부길이(mm)", "생중량(g)")
+
 # ==================================================
 # 데이터 로딩 (캐시)
 # ==================================================
-@st.cache_data
-def load_environment_data():
+# 디스크 캐시 키는 함수 코드와 인자뿐이므로, 데이터 파일의 이름/수정시각/크기를
+# 인자로 넘겨 파일이 바뀌면 다시 읽도록 함. 메모리 항목 수는 CACHE_MAX_ENTRIES 로 제한
+CACHE_MAX_ENTRIES = 2
+
+def data_fingerprint():
+    stats = ((p.name, p.stat()) for p in DATA_DIR.iterdir() if p.is_file())
+    return tuple(sorted((name, s.st_mtime_ns, s.st_size) for name, s in stats))
+
+
+# 파일이 없을 때는 예외를 던져 실패 결과가 캐시되지 않도록 함
+@st.cache_data(persist="disk", show_spinner=False, max_entries=CACHE_MAX_ENTRIES)
+def load_environment_data(fingerprint: tuple):
+    # 디스크 저장소는 max_entries 로 파일을 지우지 않으므로, 새 fingerprint 로
+    # 다시 읽을 때 지난 버전의 pickle 을 먼저 정리 (이 결과는 반환 후 저장됨)
+    load_environment_data.clear()
+
     env = {}
     for f in DATA_DIR.iterdir():
         if f.suffix.lower() != ".csv":
             continue
-        school = f.stem.replace("_환경데이터", "")
-        df = pd.read_csv(f)
-        df["school"] = school
+        school = unicodedata.normalize("NFC", f.stem).replace("_환경데이터", "")
+        df = pd.read_csv(f, engine="pyarrow", dtype_backend="pyarrow", dtype=ENV_DTYPES)
+        # 학교마다 시각 표기가 달라 (2025.5.30 0:00 / 2025-05-01 5:00:00) mixed 로 파싱
+        df["time"] = pd.to_datetime(df["time"], format="mixed", cache=True)
+        df["school"] = pd.Series(school, index=df.index, dtype=SCHOOL_DTYPE)
         env[school] = df
 
     if not env:
-        st.error("환경 데이터 CSV 파일을 찾을 수 없습니다.")
-        return None
+        raise FileNotFoundError("환경 데이터 CSV 파일을 찾을 수 없습니다.")
 
-    return env
+    env_all = pd.concat(list(env.values()), ignore_index=True)
+    return env, env_all
 
 
-@st.cache_data
-def load_growth_data():
+@st.cache_data(persist="disk", show_spinner=False, max_entries=CACHE_MAX_ENTRIES)
+def load_growth_data(fingerprint: tuple):
+    load_growth_data.clear()
+
     xlsx = find_file_by_name(DATA_DIR, "4개교_생육결과데이터.xlsx")
     if xlsx is None:
-        st.error("생육 결과 XLSX 파일을 찾을 수 없습니다.")
-        return None
+        raise FileNotFoundError("생육 결과 XLSX 파일을 찾을 수 없습니다.")
 
-    excel = pd.ExcelFile(xlsx)
+    # sheet_name=None: 통합문서를 한 번만 열어 모든 시트를 {시트명: DataFrame} 으로 읽음
+    sheets = pd.read_excel(xlsx, sheet_name=None, engine="calamine")
     growth = {}
 
-    for sheet in excel.sheet_names:
-        df = pd.read_excel(xlsx, sheet_name=sheet)
-        df["school"] = sheet
+    for sheet, df in sheets.items():
+        # 개수/길이처럼 정수인 컬럼은 정수로, 실수 컬럼만 float32 로 축소
+        for c in GROWTH_COLUMNS:
+            kind = "integer" if pd.api.types.is_integer_dtype(df[c]) else "float"
+            df[c] = pd.to_numeric(df[c], downcast=kind)
+        df["school"] = pd.Series(sheet, index=df.index, dtype=SCHOOL_DTYPE)
         growth[sheet] = df
 
-    return growth
+    growth_all = pd.concat(list(growth.values()), ignore_index=True)
+    growth_all["EC"] = growth_all["school"].cat.rename_categories(EC_INFO).astype(float)
+    return growth, growth_all
 
 # ==================================================
-# EC 정보
+# 집계 (캐시)
 # ==================================================
-EC_INFO = {
-    "송도고": 1.0,
-    "하늘고": 2.0,  # 최적
-    "아라고": 4.0,
-    "동산고": 8.0,
-}
+# DataFrame 을 인자로 받지 않고 fingerprint 로 캐시된 원본을 직접 가져와
+# 해싱 비용도, 다른 DataFrame 이 같은 키로 섞일 여지도 없앰
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def ec_metrics(fingerprint: tuple):
+    growth_all = load_growth_data(fingerprint)[1]
+    return growth_all.groupby("EC", observed=True, sort=True).agg(
+        weight=("생중량(g)", "mean"),
+        leaves=("잎 수(장)", "mean"),
+        length=("지상부 길이(mm)", "mean"),
+        count=("school", "size"),
+    ).reset_index()
 
 # ==================================================
-# 데이터 로딩
+# XLSX 다운로드 (버튼 클릭 시에만 생성)
 # ==================================================
-with st.spinner("데이터 로딩 중..."):
-    env_data = load_environment_data()
-    growth_data = load_growth_data()
+def build_xlsx(df: pd.DataFrame):
+    # float32 를 그대로 쓰면 0.30000001 처럼 저장되므로 최단 표기를 거쳐 float64 로 복원
+    f32 = df.select_dtypes("float32").columns
+    df = df.astype({c: str for c in f32}).astype({c: "float64" for c in f32})
+
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine="openpyxl")
+    return buffer.getvalue()
 
-if env_data is None or growth_data is None:
+# ==================================================
+# 시계열 다운샘플링 (LTTB)
+# ==================================================
+TS_MAX_POINTS = 2000
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int = TS_MAX_POINTS):
+    """Largest-Triangle-Three-Buckets 로 남길 점의 인덱스를 반환"""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype("float64")
+    y = y.astype("float64")
+
+    # 첫/마지막 점은 고정, 사이를 n_out - 2 개 버킷으로 분할
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        idx[i + 1] = a
+
+    return idx
+
+# ==================================================
+# 시계열 그래프 (학교별 1회 생성)
+# ==================================================
+# (학교, fingerprint) 별 항목이므로 학교 수만큼 곱해 둠
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES * len(EC_INFO))
+def build_timeseries_figure(school: str, fingerprint: tuple):
+    df = load_environment_data(fingerprint)[0][school]
+    t = df["time"].to_numpy()
+    t_num = t.astype("datetime64[ns]").astype("int64")
+
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True)
+    for row, (col, name) in enumerate(
+        [("temperature", "온도"), ("humidity", "습도"), ("ec", "EC")], start=1
+    ):
+        y = df[col].to_numpy()
+        keep = lttb_indices(t_num, y)
+        fig.add_scatter(x=t[keep], y=y[keep], row=row, col=1, name=name)
+
+    fig.add_hline(y=EC_INFO[school], row=3, col=1, line_dash="dash")
+    fig.update_layout(height=700, font=PLOTLY_FONT)
+    return fig
+
+# ==================================================
+# 데이터 로딩
+# ==================================================
+fingerprint = data_fingerprint()
+
+try:
+    with st.spinner("데이터 로딩 중..."):
+        env_data, all_env = load_environment_data(fingerprint)
+        growth_data, growth_all = load_growth_data(fingerprint)
+except FileNotFoundError as e:
+    st.error(str(e))
     st.stop()
 
 # ==================================================
@@ -127,12 +250,20 @@ selected_school = st.sidebar.selectbox("학교", school_options)
 # ==================================================
 st.title("🌱 극지식물 최적 EC 농도 연구")
 
-tab1, tab2, tab3 = st.tabs(["📖 실험 개요", "🌡️ 환경 데이터", "📊 생육 결과"])
+# st.tabs 는 보이지 않는 탭까지 매번 실행하므로 라디오로 선택된 화면만 렌더링
+TAB_OVERVIEW, TAB_ENV, TAB_GROWTH = "📖 실험 개요", "🌡️ 환경 데이터", "📊 생육 결과"
+active_tab = st.radio(
+    "화면",
+    [TAB_OVERVIEW, TAB_ENV, TAB_GROWTH],
+    horizontal=True,
+    label_visibility="collapsed",
+    key="active_tab",
+)
 
 # ==================================================
 # Tab 1: 실험 개요
 # ==================================================
-with tab1:
+def render_overview(growth_data, all_env):
     st.subheader("연구 배경 및 목적")
     st.write(
         "본 연구는 4개 학교의 실험 데이터를 활용하여 "
@@ -152,7 +283,6 @@ with tab1:
 
     st.table(pd.DataFrame(rows))
 
-    all_env = pd.concat(env_data.values())
     c1, c2, c3, c4 = st.columns(4)
 
     c1.metric("총 개체수", total)
@@ -163,59 +293,38 @@ with tab1:
 # ==================================================
 # Tab 2: 환경 데이터
 # ==================================================
-with tab2:
+def render_environment(all_env, selected_school, fingerprint):
     st.subheader("학교별 환경 평균 비교")
 
-    avg = []
-    for school, df in env_data.items():
-        avg.append({
-            "학교": school,
-            "temperature": df["temperature"].mean(),
-            "humidity": df["humidity"].mean(),
-            "ph": df["ph"].mean(),
-            "ec": df["ec"].mean(),
-            "target_ec": EC_INFO[school]
-        })
-
-    avg_df = pd.DataFrame(avg)
+    avg_df = all_env.groupby("school", sort=False, observed=True)[
+        ["temperature", "humidity", "ph", "ec"]
+    ].mean().reset_index()
+    avg_df["target_ec"] = avg_df["school"].map(EC_INFO).astype(float)
 
     fig = make_subplots(
         rows=2, cols=2,
         subplot_titles=("평균 온도", "평균 습도", "평균 pH", "목표 EC vs 실측 EC")
     )
 
-    fig.add_bar(x=avg_df["학교"], y=avg_df["temperature"], row=1, col=1)
-    fig.add_bar(x=avg_df["학교"], y=avg_df["humidity"], row=1, col=2)
-    fig.add_bar(x=avg_df["학교"], y=avg_df["ph"], row=2, col=1)
-    fig.add_bar(x=avg_df["학교"], y=avg_df["ec"], name="실측 EC", row=2, col=2)
-    fig.add_bar(x=avg_df["학교"], y=avg_df["target_ec"], name="목표 EC", row=2, col=2)
+    fig.add_bar(x=avg_df["school"], y=avg_df["temperature"], row=1, col=1)
+    fig.add_bar(x=avg_df["school"], y=avg_df["humidity"], row=1, col=2)
+    fig.add_bar(x=avg_df["school"], y=avg_df["ph"], row=2, col=1)
+    fig.add_bar(x=avg_df["school"], y=avg_df["ec"], name="실측 EC", row=2, col=2)
+    fig.add_bar(x=avg_df["school"], y=avg_df["target_ec"], name="목표 EC", row=2, col=2)
 
     fig.update_layout(height=700, font=PLOTLY_FONT)
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig, use_container_width=True, key="env_avg")
 
     if selected_school != "전체":
-        df = env_data[selected_school]
-
-        fig_ts = make_subplots(rows=3, cols=1, shared_xaxes=True)
-        fig_ts.add_scatter(x=df["time"], y=df["temperature"], row=1, col=1, name="온도")
-        fig_ts.add_scatter(x=df["time"], y=df["humidity"], row=2, col=1, name="습도")
-        fig_ts.add_scatter(x=df["time"], y=df["ec"], row=3, col=1, name="EC")
-
-        fig_ts.add_hline(y=EC_INFO[selected_school], row=3, col=1, line_dash="dash")
-        fig_ts.update_layout(height=700, font=PLOTLY_FONT)
-        st.plotly_chart(fig_ts, use_container_width=True)
+        fig_ts = build_timeseries_figure(selected_school, fingerprint)
+        st.plotly_chart(fig_ts, use_container_width=True, key="ts_env")
 
     with st.expander("환경 데이터 원본"):
-        env_all = pd.concat(env_data.values())
-        st.dataframe(env_all)
-
-        buffer = io.BytesIO()
-        env_all.to_excel(buffer, index=False, engine="openpyxl")
-        buffer.seek(0)
+        st.dataframe(all_env)
 
         st.download_button(
             label="환경데이터 XLSX 다운로드",
-            data=buffer.getvalue(),
+            data=lambda: build_xlsx(all_env),
             file_name="환경데이터_전체.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -223,43 +332,80 @@ with tab2:
 # ==================================================
 # Tab 3: 생육 결과
 # ==================================================
-with tab3:
-    growth_all = pd.concat(growth_data.values())
-    growth_all["EC"] = growth_all["school"].map(EC_INFO)
-
-    avg_weight = growth_all.groupby("EC")["생중량(g)"].mean()
-    best_ec = avg_weight.idxmax()
+def render_growth(growth_all, fingerprint):
+    ec_summary = ec_metrics(fingerprint)
+    best_ec = ec_summary.loc[ec_summary["weight"].idxmax(), "EC"]
 
     st.metric("🥇 최적 EC (평균 생중량)", f"{best_ec}")
 
     fig_bar = px.bar(
-        avg_weight.reset_index(),
+        ec_summary,
         x="EC",
-        y="생중량(g)",
+        y="weight",
+        labels={"weight": "생중량(g)"},
         title="EC별 평균 생중량"
     )
     fig_bar.update_layout(font=PLOTLY_FONT)
-    st.plotly_chart(fig_bar, use_container_width=True)
-
-    fig_box = px.box(
-        growth_all,
-        x="school",
-        y="생중량(g)",
-        color="school"
+    st.plotly_chart(fig_bar, use_container_width=True, key="growth_bar")
+
+    # 사분위수를 미리 계산해 Plotly의 점 단위 정렬을 생략
+    weight = growth_all.groupby("school", sort=False, observed=True)["생중량(g)"]
+    quart = weight.quantile([.25, .5, .75]).unstack()
+    iqr = quart[.75] - quart[.25]
+    low = growth_all["school"].map(quart[.25] - 1.5 * iqr).astype(float)
+    high = growth_all["school"].map(quart[.75] + 1.5 * iqr).astype(float)
+    inside = growth_all["생중량(g)"].between(low, high)
+    fences = growth_all[inside].groupby("school", sort=False, observed=True)["생중량(g)"].agg(
+        ["min", "max"]
     )
-    fig_box.update_layout(font=PLOTLY_FONT)
-    st.plotly_chart(fig_box, use_container_width=True)
+
+    # 울타리 밖의 점만 이상치 마커로 따로 표시 (px.box 기본 동작과 동일)
+    outliers = growth_all[~inside]
+    colors = px.colors.qualitative.Plotly
+
+    fig_box = go.Figure()
+    for i, school in enumerate(quart.index):
+        color = colors[i % len(colors)]
+        fig_box.add_box(
+            name=school,
+            legendgroup=school,
+            x=[school],
+            q1=[quart.at[school, .25]],
+            median=[quart.at[school, .5]],
+            q3=[quart.at[school, .75]],
+            lowerfence=[fences.at[school, "min"]],
+            upperfence=[fences.at[school, "max"]],
+            marker_color=color,
+        )
+        points = outliers.loc[outliers["school"] == school, "생중량(g)"]
+        fig_box.add_scatter(
+            name=school,
+            legendgroup=school,
+            showlegend=False,
+            x=[school] * len(points),
+            y=points,
+            mode="markers",
+            marker_color=color,
+        )
+    fig_box.update_layout(font=PLOTLY_FONT, xaxis_title="school", yaxis_title="생중량(g)")
+    st.plotly_chart(fig_box, use_container_width=True, key="growth_box")
 
     with st.expander("생육 데이터 원본"):
         st.dataframe(growth_all)
 
-        buffer = io.BytesIO()
-        growth_all.to_excel(buffer, index=False, engine="openpyxl")
-        buffer.seek(0)
-
         st.download_button(
             label="생육결과 XLSX 다운로드",
-            data=buffer.getvalue(),
+            data=lambda: build_xlsx(growth_all),
             file_name="생육결과_전체.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
+
+# ==================================================
+# 선택된 화면 렌더링
+# ==================================================
+if active_tab == TAB_OVERVIEW:
+    render_overview(growth_data, all_env)
+elif active_tab == TAB_ENV:
+    render_environment(all_env, selected_school, fingerprint)
+else:
+    render_growth(growth_all, fingerprint)